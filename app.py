@@ -3,30 +3,218 @@ Markov Chain Text Generator - Flask API Server
 Serves both the API endpoints and static frontend files
 """
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
 from markov_engine import MarkovChain, analyze_text
+from batch import BATCH_CALLS, run_batch
 from corpuses import CORPUSES
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Optional
+from io import BytesIO
+import hashlib
+import orjson
 import os
+import zlib
 
-# Initialize Flask app - serve static files from current directory
-app = Flask(__name__, static_folder='.', static_url_path='')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson instead of the stdlib encoder"""
+
+    # Keep insertion order unless sorting is asked for (sorting costs time)
+    sort_keys = False
+
+    def options(self, sort_keys, indent):
+        """orjson option flags for the stdlib-style sort_keys/indent settings"""
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            # orjson only indents by two spaces
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self.options(kwargs.get('sort_keys', self.sort_keys), kwargs.get('indent'))
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Same argument handling as jsonify(): one value, several (a list) or keywords
+        if args and kwargs:
+            raise TypeError('app.json.response() takes either args or kwargs, not both')
+        obj = args[0] if len(args) == 1 else (args or kwargs or None)
+
+        # Pretty-print in debug mode unless compact is set, like Flask's provider
+        indent = self._app.debug if self.compact is None else not self.compact
+
+        # Build the body straight from orjson bytes (skips the str round-trip)
+        body = orjson.dumps(obj, default=self.default, option=self.options(self.sort_keys, indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+class TrainRequest(BaseModel):
+    """Payload for POST /api/train (either ad-hoc text or a built-in corpus_id)"""
+    text: Optional[str] = Field(None, min_length=1)
+    corpus_id: Optional[str] = None
+    order: int = Field(2, ge=1, le=10, strict=True)
+    corpus_name: Optional[str] = None
+
+    @model_validator(mode='after')
+    def check_source(self):
+        if (self.text is None) == (self.corpus_id is None):
+            raise ValueError('Provide exactly one of "text" or "corpus_id"')
+        return self
+
+
+class GenerateRequest(BaseModel):
+    """Payload for POST /api/generate"""
+    length: int = Field(50, ge=1, le=500, strict=True)
+    seed: Optional[str] = None
+    stream: bool = False
+
+
+class NgramsRequest(BaseModel):
+    """Payload for POST /api/ngrams"""
+    n: int = Field(2, ge=1, le=10, strict=True)
+    limit: int = Field(20, ge=1, le=100, strict=True)
+
+
+class AnalyzeRequest(BaseModel):
+    """Payload for POST /api/analyze"""
+    text: str = Field(min_length=1)
+
+
+class GzipRequestMiddleware:
+    """WSGI middleware that inflates request bodies sent with Content-Encoding: gzip"""
+
+    # Refuse bodies larger than this, compressed or inflated (guards against gzip bombs)
+    max_size = 64 * 1024 * 1024
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').lower() == 'gzip':
+            stream = environ['wsgi.input']
+            if environ.get('CONTENT_LENGTH'):
+                try:
+                    length = int(environ['CONTENT_LENGTH'])
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    return self.error('Invalid Content-Length', 400)(environ, start_response)
+                if length > self.max_size:
+                    return self.error('Request body too large', 413)(environ, start_response)
+                raw = stream.read(length)
+            elif environ.get('wsgi.input_terminated'):
+                # Chunked upload: the server ends the input at the last chunk
+                raw = self.read_to_eof(stream)
+                if len(raw) > self.max_size:
+                    return self.error('Request body too large', 413)(environ, start_response)
+            else:
+                return self.error('Content-Length is required for gzip request bodies',
+                                  411)(environ, start_response)
+
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = inflater.decompress(raw, self.max_size + 1)
+            except zlib.error:
+                return self.error('Invalid gzip request body', 400)(environ, start_response)
+            if len(body) > self.max_size or inflater.unconsumed_tail:
+                return self.error('Request body too large', 413)(environ, start_response)
+            if not inflater.eof:
+                return self.error('Truncated gzip request body', 400)(environ, start_response)
+
+            environ['wsgi.input'] = BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+    def read_to_eof(self, stream):
+        """Read a terminated input until EOF, stopping just past max_size"""
+        chunks, size = [], 0
+        while size <= self.max_size:
+            chunk = stream.read(min(64 * 1024, self.max_size + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks)
+
+    @staticmethod
+    def error(message, status):
+        """JSON error response in the same shape as the API's own errors"""
+        return json_response({'success': False, 'error': message}, status)
+
+
+def json_response(payload, status=200):
+    """Serialize a payload with orjson and wrap it in a JSON response"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS),
+                    status=status, mimetype='application/json')
+
+
+# Fixed envelope of the statistics response; the statistics dict itself is
+# serialized as-is, so every key _build_statistics produces is included
+_STATISTICS_PREFIX = b'{"success":true,"statistics":'
+
+
+def ndjson_words(words):
+    """Encode each generated word as one newline-delimited JSON line"""
+    for word in words:
+        yield orjson.dumps({'word': word}) + b'\n'
+
+
+# Initialize Flask app - frontend assets (CSS, JS, etc.) are served from ./static
+app = Flask(__name__, static_folder='static', static_url_path='')
+app.json = OrjsonProvider(app)
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
 CORS(app)  # Enable CORS for all routes
 
-# Global markov chain instance
-markov = MarkovChain()
+# Compress large JSON payloads (corpus text, n-grams) when the client accepts it
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_STREAMS'] = False  # Leave streamed responses untouched
+Compress(app)
+
+# Global markov chain instance (models of the built-in corpuses are cached on disk)
+markov = MarkovChain(cache_dir=os.environ.get('MODEL_CACHE_DIR', '.model_cache'))
+
+# Built-in corpus texts; only these are cached on disk, so clients cannot fill it
+_BUILTIN_TEXTS = frozenset(corpus['text'] for corpus in CORPUSES.values())
+
+# Corpus listing is static, so serialize it once at startup
+_CORPUS_LIST_JSON = orjson.dumps({
+    'success': True,
+    'corpuses': [
+        {
+            'key': key,
+            'title': data['title'],
+            'author': data['author'],
+            'word_count': len(data['text'].split())
+        }
+        for key, data in CORPUSES.items()
+    ]
+})
+
+# Serialized body and ETag of each corpus response
+_CORPUS_JSON = {
+    key: (body, hashlib.sha1(body).hexdigest())
+    for key, body in (
+        (key, orjson.dumps({'success': True, 'corpus': corpus}))
+        for key, corpus in CORPUSES.items()
+    )
+}
 
 
 @app.route('/')
 def serve_frontend():
     """Serve the main HTML file"""
-    return send_from_directory('.', 'index.html')
-
-
-@app.route('/<path:path>')
-def serve_static(path):
-    """Serve static files (CSS, JS, etc.)"""
-    return send_from_directory('.', path)
+    return app.send_static_file('index.html')
 
 
 @app.route('/api')
@@ -41,7 +229,8 @@ def index():
             'POST /api/generate': 'Generate text',
             'GET /api/statistics': 'Get model statistics',
             'POST /api/ngrams': 'Get n-gram frequencies',
-            'POST /api/analyze': 'Analyze text'
+            'POST /api/analyze': 'Analyze text',
+            'POST /api/batch': 'Run several calls in one request'
         }
     })
 
@@ -49,26 +238,7 @@ def index():
 @app.route('/api/corpuses', methods=['GET'])
 def get_corpuses():
     """Get list of available corpuses"""
-    try:
-        corpus_list = [
-            {
-                'key': key,
-                'title': data['title'],
-                'author': data['author'],
-                'word_count': len(data['text'].split())
-            }
-            for key, data in CORPUSES.items()
-        ]
-        
-        return jsonify({
-            'success': True,
-            'corpuses': corpus_list
-        })
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return Response(_CORPUS_LIST_JSON, mimetype='application/json')
 
 
 @app.route('/api/corpus/<corpus_key>', methods=['GET'])
@@ -81,11 +251,11 @@ def get_corpus(corpus_key):
                 'error': f'Corpus "{corpus_key}" not found'
             }), 404
         
-        corpus = CORPUSES[corpus_key]
-        return jsonify({
-            'success': True,
-            'corpus': corpus
-        })
+        # Corpuses never change, so clients can revalidate with If-None-Match
+        body, etag = _CORPUS_JSON[corpus_key]
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -96,34 +266,22 @@ def get_corpus(corpus_key):
 @app.route('/api/train', methods=['POST'])
 def train_model():
     """Train the Markov Chain model"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No data provided'
-            }), 400
-        
-        text = data.get('text')
-        order = data.get('order', 2)
-        corpus_name = data.get('corpus_name', 'Custom')
-        
-        if not text:
-            return jsonify({
-                'success': False,
-                'error': 'No text provided'
-            }), 400
-        
-        # Validate order
-        if not isinstance(order, int) or order < 1 or order > 10:
+    req = TrainRequest.model_validate_json(request.get_data())
+    text, corpus_name = req.text, req.corpus_name or 'Custom'
+    
+    # Built-in corpuses are loaded server-side instead of being re-uploaded
+    if req.corpus_id is not None:
+        if req.corpus_id not in CORPUSES:
             return jsonify({
                 'success': False,
-                'error': 'Order must be an integer between 1 and 10'
-            }), 400
-        
-        # Train the model
-        statistics = markov.train(text, order)
+                'error': f'Corpus "{req.corpus_id}" not found'
+            }), 404
+        corpus = CORPUSES[req.corpus_id]
+        text, corpus_name = corpus['text'], req.corpus_name or corpus['title']
+    
+    try:
+        # Train the model (built-in text is cached whether sent by id or in full)
+        statistics = markov.train(text, req.order, cache=text in _BUILTIN_TEXTS)
         
         return jsonify({
             'success': True,
@@ -146,24 +304,15 @@ def train_model():
 @app.route('/api/generate', methods=['POST'])
 def generate_text():
     """Generate text using the trained model"""
+    req = GenerateRequest.model_validate_json(request.get_data())
+    length, seed = req.length, req.seed
+    
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No data provided'
-            }), 400
-        
-        length = data.get('length', 50)
-        seed = data.get('seed', None)
-        
-        # Validate length
-        if not isinstance(length, int) or length < 1 or length > 500:
-            return jsonify({
-                'success': False,
-                'error': 'Length must be an integer between 1 and 500'
-            }), 400
+        # Stream words as they are generated when the client asks for it
+        if req.stream:
+            words = markov.generate_iter(length, seed)
+            return Response(stream_with_context(ndjson_words(words)),
+                            mimetype='application/x-ndjson')
         
         # Generate text
         generated_text = markov.generate(length, seed)
@@ -198,18 +347,16 @@ def generate_text():
 def get_statistics():
     """Get statistics about the trained model"""
     try:
-        if not markov.chain:
+        if not markov.is_trained:
             return jsonify({
                 'success': False,
                 'error': 'Model not trained'
             }), 400
         
         statistics = markov.get_statistics()
+        body = _STATISTICS_PREFIX + orjson.dumps(statistics) + b'}'
         
-        return jsonify({
-            'success': True,
-            'statistics': statistics
-        })
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         return jsonify({
@@ -221,31 +368,9 @@ def get_statistics():
 @app.route('/api/ngrams', methods=['POST'])
 def get_ngrams():
     """Get n-gram frequencies"""
+    req = NgramsRequest.model_validate_json(request.get_data())
+    
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No data provided'
-            }), 400
-        
-        n = data.get('n', 2)
-        limit = data.get('limit', 20)
-        
-        # Validate parameters
-        if not isinstance(n, int) or n < 1 or n > 10:
-            return jsonify({
-                'success': False,
-                'error': 'N must be an integer between 1 and 10'
-            }), 400
-        
-        if not isinstance(limit, int) or limit < 1 or limit > 100:
-            return jsonify({
-                'success': False,
-                'error': 'Limit must be an integer between 1 and 100'
-            }), 400
-        
         if not markov.corpus_text:
             return jsonify({
                 'success': False,
@@ -253,9 +378,9 @@ def get_ngrams():
             }), 400
         
         # Get n-grams
-        ngrams = markov.get_ngram_frequencies(n, limit)
+        ngrams = markov.get_ngram_frequencies(req.n, req.limit)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'ngrams': ngrams
         })
@@ -270,25 +395,11 @@ def get_ngrams():
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     """Analyze text and return statistics"""
+    req = AnalyzeRequest.model_validate_json(request.get_data())
+    
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No data provided'
-            }), 400
-        
-        text = data.get('text')
-        
-        if not text:
-            return jsonify({
-                'success': False,
-                'error': 'No text provided'
-            }), 400
-        
         # Analyze text
-        analysis = analyze_text(text)
+        analysis = analyze_text(req.text)
         
         return jsonify({
             'success': True,
@@ -302,6 +413,45 @@ def analyze():
         }), 500
 
 
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several API calls in one request"""
+    calls = BATCH_CALLS.validate_json(request.get_data())
+    
+    try:
+        results = run_batch(app, calls)
+        
+        return json_response({
+            'success': True,
+            'results': results
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Batch failed: {str(e)}'
+        }), 500
+
+
+@app.errorhandler(ValidationError)
+def invalid_payload(error):
+    """Handle request payloads that fail validation"""
+    errors = error.errors(include_url=False)
+    message = '; '.join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e['loc'] else e['msg']
+        for e in errors
+    )
+    return jsonify({
+        'success': False,
+        'error': message
+    }), 400
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -341,6 +491,7 @@ if __name__ == '__main__':
     print("   GET  /api/statistics - Get model statistics")
     print("   POST /api/ngrams - Get n-gram frequencies")
     print("   POST /api/analyze - Analyze text")
+    print("   POST /api/batch - Run several calls in one request")
     print("\n✨ Ready to generate text!")
     print("="*50 + "\n")
     
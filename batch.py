@@ -0,0 +1,182 @@
+"""
+Batch execution for the Markov Chain API
+Runs several API calls in one HTTP request, feeding earlier results into later calls
+"""
+
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Literal, Optional
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+from urllib.parse import urlsplit
+
+# Calls in the same wave run on this many threads
+MAX_WORKERS = 4
+
+# Most calls accepted in one batch (each may retrain the model)
+MAX_CALLS = 20
+
+
+class BatchCall(BaseModel):
+    """One API call inside a POST /api/batch payload"""
+    id: int
+    method: Literal['GET', 'POST'] = 'GET'
+    path: str
+    body: Optional[Dict[str, Any]] = None
+    # Maps a target in this call's body ("body.text") to "<call id>:<path in its response>"
+    input_from: Dict[str, str] = {}
+    # Earlier calls that must finish first (e.g. /generate after /train)
+    depends_on: List[int] = []
+
+
+BATCH_CALLS = TypeAdapter(List[BatchCall])
+
+
+def lookup(data: Any, path: str) -> Any:
+    """Follow a dotted path ("corpus.text", "ngrams.0.ngram") into decoded JSON"""
+    for key in path.split('.') if path else []:
+        data = data[int(key)] if isinstance(data, list) else data[key]
+    return data
+
+
+def api_path(path: str) -> str:
+    """Full /api URL of a call path, with "." and ".." segments resolved"""
+    parts = urlsplit(path)
+    target = posixpath.normpath('/api' + parts.path)
+    return f'{target}?{parts.query}' if parts.query else target
+
+
+def plan_waves(calls: List[BatchCall]) -> List[List[BatchCall]]:
+    """
+    Group calls into waves that can run concurrently
+
+    A call lands in the wave after the latest call it depends on, either
+    through input_from or depends_on.
+
+    Args:
+        calls: Calls in submission order
+
+    Returns:
+        List of waves, each a list of independent calls
+
+    Raises:
+        ValueError: If there are too many calls, a call references an unknown
+            or later call, its path does not stay under /api, or an input
+            target is not a "body." path
+    """
+    if len(calls) > MAX_CALLS:
+        raise ValueError(f'A batch can hold at most {MAX_CALLS} calls')
+
+    levels: Dict[int, int] = {}
+    waves: List[List[BatchCall]] = []
+
+    for call in calls:
+        if call.id in levels:
+            raise ValueError(f'Duplicate call id {call.id}')
+        # Resolved path, so ".." cannot escape /api or hide a nested /batch
+        target = api_path(call.path).partition('?')[0]
+        if target != '/api' and not target.startswith('/api/'):
+            raise ValueError(f'Call {call.id} path must be an /api endpoint')
+        if target == '/api/batch':
+            raise ValueError('Batches cannot be nested')
+
+        deps = set(call.depends_on)
+        for target, source in call.input_from.items():
+            keys = target.split('.')
+            if len(keys) < 2 or keys[0] != 'body' or not all(keys):
+                raise ValueError(f'Invalid input target "{target}" in call {call.id}')
+            ref, sep, _ = source.partition(':')
+            if not sep or not ref.lstrip('-').isdigit():
+                raise ValueError(f'Invalid input reference "{source}" in call {call.id}')
+            deps.add(int(ref))
+
+        for dep in deps:
+            if dep not in levels:
+                raise ValueError(f'Call {call.id} depends on unknown or later call {dep}')
+
+        level = max((levels[dep] + 1 for dep in deps), default=0)
+        levels[call.id] = level
+        if level == len(waves):
+            waves.append([])
+        waves[level].append(call)
+
+    return waves
+
+
+def run_call(app, call: BatchCall, results: Dict[int, Dict]) -> Dict:
+    """Dispatch one call through the app's routing and error handlers"""
+    body = dict(call.body or {})
+
+    # Fill inputs from the responses of earlier calls
+    for target, source in call.input_from.items():
+        ref, _, path = source.partition(':')
+        dep = results[int(ref)]
+        if dep['status'] >= 400:
+            return {'id': call.id, 'status': 424,
+                    'body': {'success': False, 'error': f'Call {ref} failed'}}
+        try:
+            value = lookup(orjson.loads(dep['raw']) if 'raw' in dep else dep['body'], path)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return {'id': call.id, 'status': 400,
+                    'body': {'success': False, 'error': f'Call {ref} has no value at "{path}"'}}
+
+        # Targets are "body.<key>[.<key>...]" (checked in plan_waves)
+        keys = target.split('.')[1:]
+        node = body
+        try:
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = value
+        except (AttributeError, TypeError):
+            return {'id': call.id, 'status': 400,
+                    'body': {'success': False, 'error': f'Cannot set input target "{target}"'}}
+
+    data = orjson.dumps(body) if call.method == 'POST' else None
+    try:
+        with app.test_request_context(api_path(call.path), method=call.method, data=data,
+                                      content_type='application/json'):
+            response = app.full_dispatch_request()
+            # File responses are passthrough; read them like any other body
+            response.direct_passthrough = False
+            payload = response.get_data()
+    except Exception as e:
+        return {'id': call.id, 'status': 500,
+                'body': {'success': False, 'error': str(e)}}
+
+    # JSON bodies are spliced into the batch response as-is instead of being
+    # decoded and re-encoded; the raw bytes are kept for input_from lookups.
+    # Empty bodies (e.g. a 204) are not valid JSON, so they stay strings
+    if response.is_json and payload.strip():
+        return {'id': call.id, 'status': response.status_code,
+                'body': orjson.Fragment(payload), 'raw': payload}
+    return {'id': call.id, 'status': response.status_code,
+            'body': payload.decode('utf-8', errors='replace')}
+
+
+def run_batch(app, calls: List[BatchCall]) -> List[Dict]:
+    """
+    Execute a batch of API calls wave by wave
+
+    Args:
+        app: Flask application to dispatch calls through
+        calls: Calls in submission order
+
+    Returns:
+        One {id, status, body} result per call, in submission order
+
+    Raises:
+        ValueError: If the call dependencies are invalid
+    """
+    waves = plan_waves(calls)
+    results: Dict[int, Dict] = {}
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for wave in waves:
+            for result in executor.map(lambda call: run_call(app, call, results), wave):
+                results[result['id']] = result
+
+    return [
+        {key: value for key, value in results[call.id].items() if key != 'raw'}
+        for call in calls
+    ]
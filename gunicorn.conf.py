@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration for production deployments
+Run with: gunicorn app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# The trained model lives in process memory, so every worker keeps its own copy.
+# Keep a single worker by default (train + generate must hit the same process)
+# and get concurrency from threads; raise WEB_CONCURRENCY only if clients train
+# and generate against the same worker (e.g. sticky sessions).
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Load the app (and corpuses) once in the master so workers share it copy-on-write
+preload_app = True
+
+# Heartbeat files on tmpfs avoid disk fsyncs
+worker_tmp_dir = '/dev/shm'
+
+timeout = 60
@@ -3,22 +3,160 @@ Markov Chain Text Generator - Python Engine
 Supports variable-order Markov models for text generation
 """
 
+import hashlib
+import os
+import pickle
 import random
 import re
+import threading
 from collections import defaultdict, Counter
-from typing import List, Dict, Tuple, Optional
+from typing import Iterator, List, Dict, NamedTuple, Tuple, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Id given to seed words missing from the vocabulary (never appears in the chain)
+UNKNOWN_ID = -1
+
+# Trailing punctuation that ends a sentence
+SENTENCE_ENDINGS = ('.', '!', '?')
+
+# Splits text into sentences on runs of terminal punctuation
+_SENT_SPLIT = re.compile(r'[.!?]+').split
+
+
+def _state_labels(ids: np.ndarray, order: int, num_windows: int, vocab_size: int) -> np.ndarray:
+    """
+    Assign a dense integer label to the state starting at each window
+    
+    Folds one word id into the label per step, re-densifying with np.unique
+    so the combined key always fits in an int64.
+    
+    Args:
+        ids: Word ids of the tokenized corpus
+        order: Number of words per state
+        num_windows: Number of state positions to label
+        vocab_size: Number of distinct word ids
+        
+    Returns:
+        Array of state labels, one per window
+    """
+    labels = ids[:num_windows].astype(np.int64)
+    for k in range(1, order):
+        combined = labels * vocab_size + ids[k:k + num_windows]
+        _, labels = np.unique(combined, return_inverse=True)
+    return labels.ravel()
+
+
+class ModelSnapshot(NamedTuple):
+    """
+    Immutable view of a trained model
+    
+    train() builds a new snapshot and swaps it in with a single assignment,
+    so readers that bind the current snapshot never see a half-built model.
+    """
+    order: int
+    corpus_text: str
+    tokens: List[str]
+    word_count: int
+    vocab: Dict[str, int]
+    id2word: List[str]
+    unique_words: set
+    unique_lower: set
+    # Transition table in CSR layout: the successors of state i are
+    # successors[offsets[i]:offsets[i + 1]], and next_state holds the
+    # state reached by each successor (-1 for a dead end)
+    state_index: Dict[Tuple[int, ...], int]
+    offsets: np.ndarray
+    successors: np.ndarray
+    next_state: np.ndarray
+    start_words: List[Tuple[int, ...]]
+    start_states: List[int]
+    sentence_end: List[bool]
+    word_to_states: Dict[str, List[Tuple[int, ...]]]
+    statistics: Dict
+    ngram_cache: Dict[Tuple[int, int], List[Dict]]
+
+
+# Part of every cache file name; bump when the saved fields or their layout
+# change so old files are ignored instead of loaded
+_CACHE_VERSION = 1
+
+# Snapshot fields written to / restored from the on-disk cache (the rest are
+# derived from the corpus text on load)
+_MODEL_FIELDS = (
+    'vocab', 'id2word', 'unique_words', 'unique_lower', 'state_index', 'offsets',
+    'successors', 'next_state', 'start_words', 'start_states', 'sentence_end',
+    'word_to_states', 'statistics',
+)
+
+
+def _build_statistics(order: int, word_count: int, unique_words: int,
+                      states: int, transitions: int) -> Dict:
+    """Assemble the statistics dictionary from model counts"""
+    avg_transitions = transitions / states if states else 0
+    vocab_richness = (unique_words / word_count * 100) if word_count > 0 else 0
+    
+    return {
+        'order': order,
+        'word_count': word_count,
+        'unique_words': unique_words,
+        'states': states,
+        'transitions': transitions,
+        'average_transitions': round(avg_transitions, 2),
+        'vocabulary_richness': round(vocab_richness, 2)
+    }
+
+
+def _empty_snapshot() -> ModelSnapshot:
+    """Snapshot of an untrained model"""
+    return ModelSnapshot(
+        order=1, corpus_text='', tokens=[], word_count=0, vocab={}, id2word=[],
+        unique_words=set(), unique_lower=set(), state_index={},
+        offsets=np.zeros(1, dtype=np.int64), successors=np.empty(0, dtype=np.int32),
+        next_state=np.empty(0, dtype=np.int32), start_words=[], start_states=[],
+        sentence_end=[], word_to_states={}, statistics=_build_statistics(1, 0, 0, 0, 0),
+        ngram_cache={},
+    )
 
 
 class MarkovChain:
     """Markov Chain text generator with configurable order"""
     
-    def __init__(self):
-        self.chain: Dict[str, List[str]] = defaultdict(list)
-        self.order: int = 1
-        self.start_words: List[str] = []
-        self.corpus_text: str = ''
-        self.word_count: int = 0
-        self.unique_words: set = set()
+    def __init__(self, cache_dir: Optional[str] = None):
+        # Trained models are pickled here, keyed by corpus hash and order
+        self.cache_dir = cache_dir
+        self.model: ModelSnapshot = _empty_snapshot()
+    
+    @property
+    def order(self) -> int:
+        """Order of the trained chain"""
+        return self.model.order
+    
+    @property
+    def corpus_text(self) -> str:
+        """Text the model was trained on"""
+        return self.model.corpus_text
+    
+    @property
+    def word_count(self) -> int:
+        """Number of tokens in the training corpus"""
+        return self.model.word_count
+    
+    @property
+    def unique_words(self) -> set:
+        """Distinct words in the training corpus"""
+        return self.model.unique_words
+    
+    @property
+    def start_words(self) -> List[Tuple[int, ...]]:
+        """States that begin a sentence"""
+        return self.model.start_words
+    
+    @property
+    def is_trained(self) -> bool:
+        """Whether a model has been trained"""
+        return bool(self.model.state_index)
         
     def tokenize(self, text: str) -> List[str]:
         """
@@ -37,19 +175,24 @@ class MarkovChain:
     
     def is_sentence_start(self, word: str) -> bool:
         """Check if a word marks the start of a sentence"""
-        return bool(re.search(r'[.!?]$', word))
+        return word.endswith(SENTENCE_ENDINGS)
     
     def is_sentence_end(self, word: str) -> bool:
         """Check if a word marks the end of a sentence"""
-        return bool(re.search(r'[.!?]$', word))
+        return word.endswith(SENTENCE_ENDINGS)
     
-    def train(self, text: str, order: int = 2) -> Dict:
+    def train(self, text: str, order: int = 2, cache: bool = False) -> Dict:
         """
         Train the Markov Chain model on a text corpus
         
+        The previous model keeps serving requests until the new one is
+        fully built, and stays in place if training fails.
+        
         Args:
             text: Training text corpus
             order: Order of the Markov chain (1, 2, 3, etc.)
+            cache: Reuse/persist the model in cache_dir; only pass True for
+                trusted, bounded corpuses (e.g. the built-in ones)
             
         Returns:
             Dictionary with training statistics
@@ -57,14 +200,7 @@ class MarkovChain:
         Raises:
             ValueError: If corpus is too small for the specified order
         """
-        self.chain = defaultdict(list)
-        self.start_words = []
-        self.order = order
-        self.corpus_text = text
-        self.unique_words = set()
-        
         tokens = self.tokenize(text)
-        self.word_count = len(tokens)
         
         if len(tokens) < order + 1:
             raise ValueError(
@@ -72,29 +208,112 @@ class MarkovChain:
                 f"Need at least {order + 1} words, got {len(tokens)}."
             )
         
-        # Build the chain
-        for i in range(len(tokens) - order):
-            # Create the state (n-gram of 'order' words)
-            state = ' '.join(tokens[i:i + order])
-            next_word = tokens[i + order]
-            
-            # Track unique words
-            for word in tokens[i:i + order]:
-                self.unique_words.add(word)
-            self.unique_words.add(next_word)
-            
-            # Store start words (for beginning generation)
-            if i == 0 or self.is_sentence_start(tokens[i - 1]):
-                self.start_words.append(state)
-            
-            # Add to chain
-            self.chain[state].append(next_word)
+        # Reuse a previously trained model for the same corpus and order
+        cache_path = self._cache_path(text, order) if cache else None
+        model = self._load_model(cache_path, text, tokens, order) if cache_path else None
+        if model is None:
+            model = self._build_model(text, tokens, order)
+            if cache_path:
+                self._save_model(cache_path, model)
+        
+        # Publish the new model in one atomic assignment
+        self.model = model
+        return model.statistics
+    
+    def _build_model(self, text: str, tokens: List[str], order: int) -> ModelSnapshot:
+        """Build a trained model snapshot from tokenized text"""
+        # Map each word to an integer id once; the chain works on ids only
+        vocab = {}
+        ids = np.array([vocab.setdefault(word, len(vocab)) for word in tokens], dtype=np.int32)
+        id2word = list(vocab)
+        unique_words = set(vocab)
+        
+        # Build the chain: label each window's state, then group successors by label
+        num_windows = len(ids) - order
+        state_ids = _state_labels(ids, order, num_windows, len(vocab))
+        by_state = np.argsort(state_ids, kind='stable')
+        counts = np.bincount(state_ids)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        successors = ids[by_state + order]
+        windows = sliding_window_view(ids, order)
+        states = windows[by_state[offsets[:-1]]]
+        state_index = dict(zip(map(tuple, states.tolist()), range(len(states))))
+        
+        # The state after a transition is the state of the next window; the
+        # final window's successor state only exists if it occurs elsewhere
+        tail_state = state_index.get(tuple(ids[num_windows:].tolist()), -1)
+        next_state = np.append(state_ids, tail_state)[by_state + 1].astype(np.int32)
+        
+        # Store start words (for beginning generation): the first window and
+        # every window that follows a sentence-ending word
+        ends = np.fromiter((word.endswith(SENTENCE_ENDINGS) for word in id2word),
+                           dtype=bool, count=len(id2word))
+        start_positions = np.flatnonzero(ends[ids[:num_windows - 1]]) + 1
+        start_positions = np.concatenate(([0], start_positions))
         
-        # If no start words found, use the first state
-        if not self.start_words:
-            self.start_words.append(' '.join(tokens[:order]))
+        # Index states by lowercase word for seed lookups
+        lower_ids = [word.lower() for word in id2word]
+        word_to_states = defaultdict(list)
+        for state in state_index:
+            for word_id in set(state):
+                word_to_states[lower_ids[word_id]].append(state)
         
-        return self.get_statistics()
+        return ModelSnapshot(
+            order=order,
+            corpus_text=text,
+            tokens=tokens,
+            word_count=len(tokens),
+            vocab=vocab,
+            id2word=id2word,
+            unique_words=unique_words,
+            unique_lower=set(lower_ids),
+            state_index=state_index,
+            offsets=offsets,
+            successors=successors,
+            next_state=next_state,
+            start_words=list(map(tuple, windows[start_positions].tolist())),
+            start_states=state_ids[start_positions].tolist(),
+            sentence_end=ends.tolist(),
+            word_to_states=dict(word_to_states),
+            # Every window contributes exactly one transition
+            statistics=_build_statistics(order, len(tokens), len(unique_words),
+                                         len(state_index), num_windows),
+            ngram_cache={},
+        )
+    
+    def _cache_path(self, text: str, order: int) -> Optional[str]:
+        """Path of the cached model for a corpus and order, if caching is enabled"""
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}_{order}_v{_CACHE_VERSION}.pkl')
+    
+    def _load_model(self, path: str, text: str, tokens: List[str],
+                    order: int) -> Optional[ModelSnapshot]:
+        """Restore a model snapshot from a cache file; None if missing or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            fields = {field: saved[field] for field in _MODEL_FIELDS}
+        except Exception:
+            # Any bad file (corrupt, foreign or from an incompatible version) is a
+            # cache miss; train() rebuilds the model and overwrites it
+            return None
+        return ModelSnapshot(order=order, corpus_text=text, tokens=tokens,
+                             word_count=len(tokens), ngram_cache={}, **fields)
+    
+    def _save_model(self, path: str, model: ModelSnapshot) -> None:
+        """Write a model snapshot to a cache file (best effort)"""
+        saved = {field: getattr(model, field) for field in _MODEL_FIELDS}
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(saved, f, protocol=5)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
     
     def generate(self, length: int = 50, seed: Optional[str] = None) -> str:
         """
@@ -111,84 +330,125 @@ class MarkovChain:
             RuntimeError: If model hasn't been trained
             ValueError: If seed word doesn't exist in corpus
         """
-        if not self.chain:
+        return ' '.join(self.generate_iter(length, seed)).strip()
+    
+    def generate_iter(self, length: int = 50, seed: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate text one word at a time
+        
+        The seed is validated eagerly, so errors are raised by this call
+        rather than on the first iteration. Sentence breaks are yielded
+        as empty strings.
+        
+        Args:
+            length: Approximate number of words to generate
+            seed: Optional seed word(s) to start generation
+            
+        Returns:
+            Iterator over generated words
+            
+        Raises:
+            RuntimeError: If model hasn't been trained
+            ValueError: If seed word doesn't exist in corpus
+        """
+        # Bind the current snapshot so a concurrent train() cannot change it mid-walk
+        model = self.model
+        if not model.state_index:
             raise RuntimeError("Model not trained. Call train() first.")
         
-        # Initialize with seed or random start word
+        return self._walk(model, self._initial_state(model, seed), length)
+    
+    def _initial_state(self, model: ModelSnapshot, seed: Optional[str]) -> Tuple[int, ...]:
+        """Pick the starting state from the seed or a random sentence start"""
         seed_used = False
         if seed:
             seed_tokens = self.tokenize(seed)
             
             # Check if any seed word exists in the corpus
-            seed_words_in_corpus = [word for word in seed_tokens if word.lower() in {w.lower() for w in self.unique_words}]
+            seed_words_in_corpus = [word for word in seed_tokens if word.lower() in model.unique_lower]
             
             if not seed_words_in_corpus:
                 # Suggest some words from the corpus
-                sample_words = list(self.unique_words)[:10] if len(self.unique_words) > 10 else list(self.unique_words)
+                sample_words = list(model.unique_words)[:10] if len(model.unique_words) > 10 else list(model.unique_words)
                 raise ValueError(
                     f"Seed word(s) '{seed}' not found in the trained corpus. "
                     f"Try words that exist in the text, such as: {', '.join(sample_words[:5])}"
                 )
             
-            if len(seed_tokens) >= self.order:
-                current_state = ' '.join(seed_tokens[-self.order:])
+            # Unknown words get an id that never appears in the chain
+            seed_ids = [model.vocab.get(word, UNKNOWN_ID) for word in seed_tokens]
+            if len(seed_ids) >= model.order:
+                current_state = tuple(seed_ids[-model.order:])
             else:
                 # Pad seed if too short
-                padding_state = random.choice(self.start_words)
-                padding_tokens = padding_state.split()[:self.order - len(seed_tokens)]
-                current_state = ' '.join(padding_tokens + seed_tokens)
+                padding_state = random.choice(model.start_words)
+                current_state = padding_state[:model.order - len(seed_ids)] + tuple(seed_ids)
             
             # If exact seed state doesn't exist in chain, try to find a state containing the seed
-            if current_state not in self.chain:
+            if current_state not in model.state_index:
                 # Try to find states that contain the seed word
-                matching_states = [state for state in self.chain.keys() 
-                                 if any(word.lower() in state.lower() for word in seed_words_in_corpus)]
+                matching_states = list(dict.fromkeys(
+                    state
+                    for word in seed_words_in_corpus
+                    for state in model.word_to_states.get(word.lower(), ())
+                ))
                 if matching_states:
                     current_state = random.choice(matching_states)
                     seed_used = True
                 else:
-                    current_state = random.choice(self.start_words)
+                    current_state = random.choice(model.start_words)
             else:
                 seed_used = True
         else:
-            current_state = random.choice(self.start_words)
+            current_state = random.choice(model.start_words)
         
-        result = current_state.split()
-        generated_words = len(result)
+        return current_state
+    
+    def _walk(self, model: ModelSnapshot, current_state: Tuple[int, ...], length: int) -> Iterator[str]:
+        """Walk the chain from a starting state, yielding words as they are chosen"""
+        id2word = model.id2word
+        offsets = model.offsets
+        successors = model.successors
+        next_state = model.next_state
+        sentence_end = model.sentence_end
+        for word_id in current_state:
+            yield id2word[word_id]
+        generated_words = len(current_state)
+        state = model.state_index[current_state]
         
         # Generate words
         max_iterations = length * 3  # Prevent infinite loops
         iterations = 0
         
+        # Draw all random indices up front instead of one call per word
+        rand_pool = np.random.randint(0, 1 << 30, size=max_iterations).tolist()
+        
         while generated_words < length and iterations < max_iterations:
             iterations += 1
             
-            possible_next_words = self.chain.get(current_state, [])
-            
-            if not possible_next_words:
+            if state < 0:
                 # Dead end - start a new sentence
-                current_state = random.choice(self.start_words)
-                result.append('')  # Add space between sentences
-                result.extend(current_state.split())
-                generated_words = len(result)
+                start = random.randrange(len(model.start_words))
+                yield ''  # Add space between sentences
+                for word_id in model.start_words[start]:
+                    yield id2word[word_id]
+                state = model.start_states[start]
+                generated_words += 1 + model.order
                 continue
             
-            next_word = random.choice(possible_next_words)
-            result.append(next_word)
+            low = offsets[state]
+            choice = low + rand_pool[iterations - 1] % (offsets[state + 1] - low)
+            next_id = successors[choice]
+            yield id2word[next_id]
             generated_words += 1
             
             # Update current state (slide the window)
-            state_words = current_state.split()
-            state_words.pop(0)
-            state_words.append(next_word)
-            current_state = ' '.join(state_words)
+            state = next_state[choice]
             
             # Occasionally start new sentences at natural boundaries
-            if self.is_sentence_end(next_word) and random.random() > 0.3:
-                if generated_words < length - self.order:
-                    current_state = random.choice(self.start_words)
-        
-        return ' '.join(result).strip()
+            if sentence_end[next_id] and random.random() > 0.3:
+                if generated_words < length - model.order:
+                    state = random.choice(model.start_states)
     
     def get_statistics(self) -> Dict:
         """
@@ -197,21 +457,7 @@ class MarkovChain:
         Returns:
             Dictionary with model statistics
         """
-        states = list(self.chain.keys())
-        transitions = sum(len(values) for values in self.chain.values())
-        
-        avg_transitions = transitions / len(states) if states else 0
-        vocab_richness = (len(self.unique_words) / self.word_count * 100) if self.word_count > 0 else 0
-        
-        return {
-            'order': self.order,
-            'word_count': self.word_count,
-            'unique_words': len(self.unique_words),
-            'states': len(states),
-            'transitions': transitions,
-            'average_transitions': round(avg_transitions, 2),
-            'vocabulary_richness': round(vocab_richness, 2)
-        }
+        return self.model.statistics
     
     def get_ngram_frequencies(self, n: int = 2, limit: int = 20) -> List[Dict]:
         """
@@ -224,17 +470,22 @@ class MarkovChain:
         Returns:
             List of dictionaries with ngram and count
         """
-        tokens = self.tokenize(self.corpus_text)
-        ngram_counts = Counter()
+        model = self.model
+        key = (n, limit)
+        if key in model.ngram_cache:
+            return model.ngram_cache[key]
         
-        for i in range(len(tokens) - n + 1):
-            ngram = ' '.join(tokens[i:i + n])
-            ngram_counts[ngram] += 1
+        tokens = model.tokens
+        ngram_counts = Counter(
+            ' '.join(gram) for gram in zip(*(tokens[k:] for k in range(n)))
+        )
         
-        return [
+        ngrams = [
             {'ngram': ngram, 'count': count}
             for ngram, count in ngram_counts.most_common(limit)
         ]
+        model.ngram_cache[key] = ngrams
+        return ngrams
 
 
 def analyze_text(text: str) -> Dict:
@@ -248,22 +499,16 @@ def analyze_text(text: str) -> Dict:
         Dictionary with analysis results
     """
     words = text.strip().split()
-    sentences = re.split(r'[.!?]+', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
+    sentences = [s for s in map(str.strip, _SENT_SPLIT(text)) if s]
     
-    # Remove punctuation for character count
-    characters = re.sub(r'\s', '', text)
+    # Non-whitespace character count is just the total length of the words
+    total_length = sum(map(len, words))
     
     # Word frequency
-    word_freq = Counter()
-    unique_words = set()
-    
-    for word in words:
-        normalized = word.lower().strip('.,!?;:')
-        unique_words.add(normalized)
-        word_freq[normalized] += 1
+    word_freq = Counter(word.lower().strip('.,!?;:') for word in words)
+    unique_words = word_freq.keys()
     
-    avg_word_length = sum(len(word) for word in words) / len(words) if words else 0
+    avg_word_length = total_length / len(words) if words else 0
     avg_sentence_length = len(words) / len(sentences) if sentences else 0
     vocab_richness = (len(unique_words) / len(words) * 100) if words else 0
     
@@ -275,7 +520,7 @@ def analyze_text(text: str) -> Dict:
     return {
         'word_count': len(words),
         'sentence_count': len(sentences),
-        'character_count': len(characters),
+        'character_count': total_length,
         'unique_words': len(unique_words),
         'average_word_length': round(avg_word_length, 2),
         'average_sentence_length': round(avg_sentence_length, 2),
@@ -334,17 +334,19 @@ async function trainModel() {
   try {
     showLoading(elements.trainBtn, true);
 
+    // Built-in corpuses are referenced by key so the server loads (and caches) them
+    const isBuiltIn = !['custom', 'upload'].includes(state.currentCorpusKey);
+    const payload = isBuiltIn
+      ? { corpus_id: state.currentCorpusKey, order: state.currentOrder }
+      : { text: state.currentCorpus, order: state.currentOrder, corpus_name: state.currentCorpusName };
+
     // Call API to train model
     const response = await fetch(`${API_BASE_URL}/train`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
       },
-      body: JSON.stringify({
-        text: state.currentCorpus,
-        order: state.currentOrder,
-        corpus_name: state.currentCorpusName
-      })
+      body: JSON.stringify(payload)
     });
 
     const data = await response.json();
@@ -1,68 +1,236 @@
 """
-Test script for Markov Chain API
-Tests all endpoints to verify functionality
+Tests for the Markov Chain API
+Run with pytest (boots the server if it is not already running), or run
+this file directly against a running server for a printed report
 """
 
 import requests
+import gzip
 import json
+import os
+import socket
+import subprocess
+import sys
+import orjson
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 
 API_BASE = 'http://localhost:5000/api'
 
-def test_api():
-    print("🧪 Testing Markov Chain API\n")
+# Endpoint URLs, built once instead of formatted on every call
+URLS = SimpleNamespace(
+    corpuses=f'{API_BASE}/corpuses',
+    corpus=f'{API_BASE}/corpus/',
+    train=f'{API_BASE}/train',
+    generate=f'{API_BASE}/generate',
+    ngrams=f'{API_BASE}/ngrams',
+    statistics=f'{API_BASE}/statistics',
+    analyze=f'{API_BASE}/analyze',
+    batch=f'{API_BASE}/batch',
+)
+
+# Large corpus responses are kept here between runs
+CACHE_DIR = Path('.cache')
+
+# (connect, read) seconds, so a stalled server fails the run instead of hanging it
+TIMEOUT = (2, 30)
+
+# Most calls issued at once by a layer (layer 0: corpus list, corpus and train)
+CONCURRENCY = 3
+
+# One keep-alive session for every call. HTTP/1.1 carries one request per
+# connection at a time, so the pool holds one connection per concurrent call
+# and parallel layers overlap on the wire while still reusing sockets
+class SocketOptionsAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets skip Nagle's delay and send keep-alive probes"""
+    
+    # urllib3's defaults already carry TCP_NODELAY; keep them and add SO_KEEPALIVE
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+SESSION = requests.Session()
+SESSION.mount('http://', SocketOptionsAdapter(pool_connections=1, pool_maxsize=CONCURRENCY))
+SESSION.headers['Accept-Encoding'] = 'gzip'
+
+# Tests 3-6 as a single /api/batch call; later calls pull inputs from earlier results
+BATCH_PLAN = [
+    {'id': 0, 'method': 'POST', 'path': '/train',
+     'body': {'corpus_id': 'shakespeare', 'order': 2}},
+    {'id': 1, 'method': 'POST', 'path': '/generate',
+     'body': {'length': 50, 'seed': 'love'}, 'depends_on': [0]},
+    {'id': 2, 'method': 'POST', 'path': '/ngrams',
+     'body': {'n': 2, 'limit': 5}, 'depends_on': [0]},
+    {'id': 3, 'method': 'POST', 'path': '/analyze',
+     'input_from': {'body.text': '1:text'}},
+]
+
+def get_corpuses():
+    return SESSION.get(URLS.corpuses, timeout=TIMEOUT)
+
+def cached_corpus(name, max_age=3600):
+    """
+    Fetch a corpus response, reusing a local copy between runs
     
+    Fresh copies are used as-is; stale ones are revalidated with their ETag.
+    Returns the decoded response and where it came from ('cache', 200 or 304).
+    """
+    path = CACHE_DIR / f'{name}.json'
+    etag_path = CACHE_DIR / f'{name}.etag'
+    if path.exists() and time.time() - path.stat().st_mtime < max_age:
+        return orjson.loads(path.read_bytes()), 'cache'
+    
+    headers = {}
+    if path.exists() and etag_path.exists():
+        headers['If-None-Match'] = etag_path.read_text()
+    response = SESSION.get(URLS.corpus + name, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304:
+        path.touch()
+        return orjson.loads(path.read_bytes()), 304
+    
+    if response.ok:
+        CACHE_DIR.mkdir(exist_ok=True)
+        path.write_bytes(response.content)
+        etag_path.write_text(response.headers.get('ETag', ''))
+    return orjson.loads(response.content), response.status_code
+
+def get_corpus():
+    return cached_corpus('shakespeare')
+
+@lru_cache(maxsize=8)
+def text_prefix(text):
+    """JSON for {"text": text} without the closing brace, escaped once per text"""
+    return orjson.dumps({'text': text})[:-1]
+
+def train(corpus_id='shakespeare', text=None, order=2):
+    # Built-in corpuses are referenced by id so the server loads the text itself
+    if text is None:
+        return SESSION.post(URLS.train, json={
+            'corpus_id': corpus_id,
+            'order': order
+        }, timeout=TIMEOUT)
+    
+    # Ad-hoc text is the largest request body: reuse its encoded prefix across
+    # orders, splice in the small fields and gzip it (level 1 keeps most of the
+    # size win for a fraction of the CPU)
+    body = text_prefix(text) + b',"order":%d,"corpus_name":"Custom"}' % order
+    return SESSION.post(URLS.train, data=gzip.compress(body, compresslevel=1),
+                        headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+                        timeout=TIMEOUT)
+
+def generate():
+    return SESSION.post(URLS.generate, json={
+        'length': 50,
+        'seed': 'love'
+    }, timeout=TIMEOUT)
+
+def get_ngrams():
+    return SESSION.post(URLS.ngrams, json={
+        'n': 2,
+        'limit': 5
+    }, timeout=TIMEOUT)
+
+def analyze(text):
+    return SESSION.post(URLS.analyze, json={
+        'text': text
+    }, timeout=TIMEOUT)
+
+def warmup():
+    """Open one pooled connection per concurrent call with cheap HEAD requests"""
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        list(executor.map(lambda _: SESSION.head(URLS.corpuses, timeout=(1, 2)),
+                          range(CONCURRENCY)))
+
+def run_layer(executor, calls):
+    """Run independent calls concurrently and wait for all of them"""
+    return list(executor.map(lambda call: call(), calls))
+
+def decoded(response):
+    """Status code and decoded JSON body of a response"""
+    return response.status_code, orjson.loads(response.content)
+
+def run_all_requests():
+    """
+    Issue every API call and decode the responses
+    
+    Nothing is formatted or printed here, so consecutive requests are
+    separated only by network time. Returns (status, data) per step.
+    """
+    # Calls are grouped into layers by data dependency; each layer runs
+    # concurrently and finishes before the next one starts
+    with SESSION, ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        # Layer 0: training loads its corpus server-side, so it runs alongside the fetches
+        corpuses_response, (corpus, corpus_source), train_response = run_layer(
+            executor, [get_corpuses, get_corpus, train])
+        
+        # Layer 1: generation needs the trained model
+        generated = decoded(generate())
+        generated_text = generated[1]['text']
+        
+        # Layer 2: n-grams and analysis only need the trained model and generated text
+        ngrams_response, analyze_response = run_layer(
+            executor, [get_ngrams, lambda: analyze(generated_text)])
+        
+        # Whole pipeline in one round trip
+        batch_response = SESSION.post(URLS.batch, json=BATCH_PLAN, timeout=TIMEOUT)
+    
+    return {
+        'corpuses': decoded(corpuses_response),
+        'corpus': (corpus_source, corpus),
+        'train': decoded(train_response),
+        'generate': generated,
+        'ngrams': decoded(ngrams_response),
+        'analyze': decoded(analyze_response),
+        'batch': decoded(batch_response),
+    }
+
+def render_report(results):
+    """Print the outcome of every step from run_all_requests()"""
     # Test 1: Get corpuses
     print("1. Testing GET /api/corpuses")
-    response = requests.get(f'{API_BASE}/corpuses')
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['corpuses']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Found {len(data['corpuses'])} corpuses")
     print()
     
     # Test 2: Get specific corpus
     print("2. Testing GET /api/corpus/shakespeare")
-    response = requests.get(f'{API_BASE}/corpus/shakespeare')
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['corpus']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Corpus: {data['corpus']['title']}")
     print(f"   ✓ Text length: {len(data['corpus']['text'])} characters")
-    corpus_text = data['corpus']['text']
     print()
     
     # Test 3: Train model
     print("3. Testing POST /api/train")
-    response = requests.post(f'{API_BASE}/train', json={
-        'text': corpus_text,
-        'order': 2,
-        'corpus_name': 'Shakespeare - Romeo & Juliet'
-    })
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['train']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Message: {data['message']}")
     print(f"   ✓ Statistics: {json.dumps(data['statistics'], indent=6)}")
     print()
     
     # Test 4: Generate text
     print("4. Testing POST /api/generate")
-    response = requests.post(f'{API_BASE}/generate', json={
-        'length': 50,
-        'seed': 'love'
-    })
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['generate']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Generated text ({data['word_count']} words):")
     print(f"   \"{data['text'][:200]}...\"")
-    generated_text = data['text']
     print()
     
     # Test 5: Get n-grams
     print("5. Testing POST /api/ngrams")
-    response = requests.post(f'{API_BASE}/ngrams', json={
-        'n': 2,
-        'limit': 5
-    })
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['ngrams']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Top 5 bigrams:")
     for item in data['ngrams']:
         print(f"      - \"{item['ngram']}\": {item['count']}")
@@ -70,23 +238,344 @@ def test_api():
     
     # Test 6: Analyze text
     print("6. Testing POST /api/analyze")
-    response = requests.post(f'{API_BASE}/analyze', json={
-        'text': generated_text
-    })
-    data = response.json()
-    print(f"   ✓ Status: {response.status_code}")
+    status, data = results['analyze']
+    print(f"   ✓ Status: {status}")
     print(f"   ✓ Analysis:")
     for key, value in data['analysis'].items():
         if key != 'top_words':
             print(f"      - {key}: {value}")
     print()
     
+    # Test 7: Whole pipeline in one round trip
+    print("7. Testing POST /api/batch")
+    status, data = results['batch']
+    print(f"   ✓ Status: {status}")
+    for result in data['results']:
+        call = BATCH_PLAN[result['id']]
+        print(f"      - {call['method']} {call['path']}: {result['status']}")
+    print()
+    
     print("✅ All tests passed!")
     print("\n🎉 Python backend is working correctly!")
 
+def main():
+    print("🧪 Testing Markov Chain API\n")
+    warmup()
+    render_report(run_all_requests())
+
+
+def server_up():
+    """Whether the API answers at API_BASE"""
+    try:
+        return SESSION.get(URLS.corpuses, timeout=TIMEOUT).ok
+    except requests.ConnectionError:
+        return False
+
+@pytest.fixture(scope='session')
+def api_server(tmp_path_factory):
+    """Base URL of the API, booting app.py in a subprocess unless one is already up"""
+    if server_up():
+        yield API_BASE
+        return
+    
+    env = dict(os.environ, FLASK_ENV='production',
+               MODEL_CACHE_DIR=str(tmp_path_factory.mktemp('models')))
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=Path(__file__).parent, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 15
+        while not server_up():
+            if server.poll() is not None or time.time() > deadline:
+                pytest.fail('API server did not start')
+            time.sleep(0.1)
+        yield API_BASE
+    finally:
+        server.terminate()
+        server.wait()
+
+@pytest.fixture(scope='session')
+def session_client(api_server):
+    """The shared keep-alive session, closed when the test session ends"""
+    with SESSION:
+        yield SESSION
+
+@pytest.fixture(scope='session', autouse=True)
+def warm_pool(session_client):
+    """Pay the TCP handshakes before any test runs"""
+    warmup()
+
+@pytest.fixture(scope='session')
+def corpus_fixture(session_client):
+    """Shakespeare corpus response, fetched once per session"""
+    return get_corpus()
+
+@pytest.fixture(scope='session')
+def trained_model(session_client):
+    """Status and body of training on Shakespeare, done once per session"""
+    return decoded(train())
+
+@pytest.fixture(scope='session')
+def generated(trained_model):
+    """Status and body of one generation from the trained model"""
+    return decoded(generate())
+
+@pytest.fixture
+def restore_model(trained_model):
+    """Retrain on Shakespeare after a test that trains on something else"""
+    yield
+    train()
+
+def test_json_provider_settings():
+    # In-process app: the orjson provider honours the stdlib-style settings
+    import app as server
+    provider = server.app.json
+    assert provider.dumps({'b': 1, 'a': 2}) == '{"b":1,"a":2}'
+    assert provider.dumps({'b': 1, 'a': 2}, sort_keys=True) == '{"a":2,"b":1}'
+    assert provider.dumps([1], indent=2) == '[\n  1\n]'
+    with server.app.app_context():
+        assert provider.response(1, 2).get_json() == [1, 2]
+        assert provider.response(a=1).get_json() == {'a': 1}
+        with pytest.raises(TypeError):
+            provider.response(1, a=1)
+
+def test_corpuses(session_client):
+    status, data = decoded(get_corpuses())
+    assert status == 200
+    assert 'shakespeare' in {corpus['key'] for corpus in data['corpuses']}
+
+def test_corpus(session_client):
+    # Always hits the server, unlike cached_corpus()
+    status, data = decoded(SESSION.get(URLS.corpus + 'shakespeare', timeout=TIMEOUT))
+    assert status == 200
+    assert data['success']
+    assert data['corpus']['text']
+
+def test_corpus_not_modified(session_client):
+    response = SESSION.get(URLS.corpus + 'shakespeare', timeout=TIMEOUT)
+    etag = response.headers['ETag']
+    response = SESSION.get(URLS.corpus + 'shakespeare', headers={'If-None-Match': etag},
+                           timeout=TIMEOUT)
+    assert response.status_code == 304
+    assert not response.content
+
+def test_train(trained_model):
+    status, data = trained_model
+    assert status == 200
+    assert data['success']
+    assert data['statistics']['order'] == 2
+    assert data['statistics']['word_count'] > 0
+
+def test_train_caches_only_builtin_text(tmp_path, monkeypatch):
+    # In-process app, so the model cache directory can be pointed at tmp_path
+    import app as server
+    monkeypatch.setattr(server.markov, 'cache_dir', str(tmp_path))
+    client = server.app.test_client()
+    
+    response = client.post('/api/train', json={'text': 'Ad-hoc text is never cached. Not even once.'})
+    assert response.status_code == 200
+    assert not os.listdir(tmp_path)
+    
+    # Built-in text is recognised even when sent in full instead of by corpus_id
+    response = client.post('/api/train', json={'text': server.CORPUSES['alice']['text']})
+    assert response.status_code == 200
+    assert len(os.listdir(tmp_path)) == 1
+
+@pytest.mark.parametrize('body, error', [
+    (b'{"corpus_id": "shakespeare", "order": 11}', 'order: '),
+    (b'{"corpus_id": "shakespeare", "order": "2"}', 'order: '),
+    (b'{"order": 2}', 'exactly one of "text" or "corpus_id"'),
+    (b'{"text": "a b c d", "corpus_id": "shakespeare"}', 'exactly one of "text" or "corpus_id"'),
+    (b'["shakespeare", 2]', 'object'),
+    (b'{"text": ', 'Invalid JSON'),
+], ids=['order-out-of-range', 'order-as-string', 'missing-text', 'text-and-corpus-id',
+        'not-an-object', 'malformed-json'])
+def test_train_rejects_invalid_payload(session_client, body, error):
+    response = SESSION.post(URLS.train, data=body, headers={'Content-Type': 'application/json'},
+                            timeout=TIMEOUT)
+    status, data = decoded(response)
+    assert status == 400
+    assert data['success'] is False
+    assert error in data['error']
+
+def test_train_rejects_unknown_corpus(session_client):
+    status, data = decoded(train(corpus_id='missing'))
+    assert status == 404
+    assert not data['success']
+
+def test_train_gzipped_text(corpus_fixture, trained_model, restore_model):
+    # Same text uploaded gzipped (inflated by the server) builds the same model
+    status, data = decoded(train(text=corpus_fixture[0]['corpus']['text']))
+    assert status == 200
+    assert data['statistics'] == trained_model[1]['statistics']
+
+def test_train_text_at_several_orders(corpus_fixture, restore_model):
+    # Both bodies splice a different order onto the same encoded text prefix
+    text = corpus_fixture[0]['corpus']['text']
+    statistics = {}
+    for order in (1, 3):
+        status, data = decoded(train(text=text, order=order))
+        assert status == 200
+        statistics[order] = data['statistics']
+        assert statistics[order]['order'] == order
+    
+    # The server saw the same text but built chains of different orders
+    assert statistics[1]['word_count'] == statistics[3]['word_count']
+    assert statistics[1]['states'] != statistics[3]['states']
+
+def test_train_chunked_gzipped_text(corpus_fixture, trained_model, restore_model):
+    # A generator body is sent with Transfer-Encoding: chunked and no Content-Length
+    body = gzip.compress(text_prefix(corpus_fixture[0]['corpus']['text']) + b',"order":2}')
+    response = SESSION.post(URLS.train, data=iter([body[:100], body[100:]]), timeout=TIMEOUT,
+                            headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.request.headers['Transfer-Encoding'] == 'chunked'
+    status, data = decoded(response)
+    assert status == 200
+    assert data['statistics'] == trained_model[1]['statistics']
+
+def test_gzip_body_without_length_or_terminated_input():
+    # In-process app: no Content-Length and an unterminated input cannot be read safely
+    import app as server
+    response = server.app.test_client().post(
+        '/api/train', data=gzip.compress(b'{"text": "a b c d"}'),
+        headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+        environ_overrides={'CONTENT_LENGTH': ''})
+    assert response.status_code == 411
+    assert response.get_json()['success'] is False
+
+@pytest.mark.parametrize('body', [b'not gzip', gzip.compress(b'{"text": "a b c"}')[:-8]],
+                         ids=['invalid', 'truncated'])
+def test_train_rejects_bad_gzip(session_client, body):
+    response = SESSION.post(URLS.train, data=body, timeout=TIMEOUT,
+                            headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    status, data = decoded(response)
+    assert status == 400
+    assert not data['success']
+
+def test_generate(generated):
+    status, data = generated
+    assert status == 200
+    assert data['word_count'] > 0
+    assert data['text']
+
+def test_generate_stream(session_client, restore_model):
+    # Every run of this corpus ends in a dead end, so sentence breaks are certain
+    status, _ = decoded(train(text='One two three. Four five six.'))
+    assert status == 200
+    
+    response = SESSION.post(URLS.generate, json={'length': 30, 'stream': True}, timeout=TIMEOUT)
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('application/x-ndjson')
+    
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    assert all(list(line) == ['word'] and isinstance(line['word'], str) for line in lines)
+    words = [line['word'] for line in lines]
+    assert '' in words
+    
+    # Joined with spaces, breaks become the double spaces /generate returns
+    text = ' '.join(words).strip()
+    assert '  ' in text
+    assert text.split() == [word for word in words if word]
+    assert set(text.split()) <= {'One', 'two', 'three.', 'Four', 'five', 'six.'}
+
+def test_generate_stream_unknown_seed(trained_model):
+    response = SESSION.post(URLS.generate, json={'stream': True, 'seed': 'zyzzyva'},
+                            timeout=TIMEOUT)
+    status, data = decoded(response)
+    assert status == 400
+    assert response.headers['Content-Type'].startswith('application/json')
+    assert not data['success']
+    assert data['error_type'] == 'invalid_seed'
+
+def test_statistics(trained_model):
+    response = SESSION.get(URLS.statistics, timeout=TIMEOUT)
+    assert response.status_code == 200
+    data = json.loads(response.content)
+    assert data == {'success': True, 'statistics': trained_model[1]['statistics']}
+
+def test_statistics_untrained(monkeypatch):
+    # In-process app with a fresh, untrained chain
+    import app as server
+    monkeypatch.setattr(server, 'markov', server.MarkovChain())
+    response = server.app.test_client().get('/api/statistics')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'Model not trained'}
+
+def test_ngrams(trained_model):
+    status, data = decoded(get_ngrams())
+    assert status == 200
+    assert len(data['ngrams']) == 5
+    assert all(len(item['ngram'].split()) == 2 for item in data['ngrams'])
+
+def test_analyze(generated):
+    status, data = decoded(analyze(generated[1]['text']))
+    assert status == 200
+    assert data['analysis']['word_count'] > 0
+
+def test_batch(trained_model):
+    status, data = decoded(SESSION.post(URLS.batch, json=BATCH_PLAN, timeout=TIMEOUT))
+    assert status == 200
+    assert [result['id'] for result in data['results']] == [call['id'] for call in BATCH_PLAN]
+    assert all(result['status'] == 200 for result in data['results'])
+
+def test_batch_failed_and_missing_inputs(session_client):
+    plan = [
+        {'id': 0, 'method': 'GET', 'path': '/corpus/missing'},
+        {'id': 1, 'method': 'POST', 'path': '/analyze', 'input_from': {'body.text': '0:corpus.text'}},
+        {'id': 2, 'method': 'GET', 'path': '/corpuses'},
+        {'id': 3, 'method': 'POST', 'path': '/analyze', 'input_from': {'body.text': '2:missing'}},
+    ]
+    status, data = decoded(SESSION.post(URLS.batch, json=plan, timeout=TIMEOUT))
+    assert status == 200
+    assert [result['status'] for result in data['results']] == [404, 424, 200, 400]
+
+@pytest.mark.parametrize('target', ['body', 'text', 'body..text'])
+def test_batch_rejects_invalid_input_targets(session_client, target):
+    plan = [
+        {'id': 0, 'method': 'GET', 'path': '/corpuses'},
+        {'id': 1, 'method': 'POST', 'path': '/analyze', 'input_from': {target: '0:success'}},
+    ]
+    status, data = decoded(SESSION.post(URLS.batch, json=plan, timeout=TIMEOUT))
+    assert status == 400
+    assert not data['success']
+
+def test_batch_input_target_through_non_object(session_client):
+    # "text" is a string, so "body.text.a" cannot be assigned
+    plan = [
+        {'id': 0, 'method': 'GET', 'path': '/corpuses'},
+        {'id': 1, 'method': 'POST', 'path': '/analyze', 'body': {'text': 'Hello there.'},
+         'input_from': {'body.text.a': '0:success'}},
+    ]
+    status, data = decoded(SESSION.post(URLS.batch, json=plan, timeout=TIMEOUT))
+    assert status == 200
+    assert [result['status'] for result in data['results']] == [200, 400]
+
+def test_batch_rejects_too_many_calls(session_client):
+    plan = [{'id': i, 'method': 'GET', 'path': '/corpuses'} for i in range(21)]
+    status, data = decoded(SESSION.post(URLS.batch, json=plan, timeout=TIMEOUT))
+    assert status == 400
+    assert not data['success']
+
+def test_batch_empty_json_body():
+    # In-process app with a route that returns an empty body under a JSON mimetype
+    from flask import Flask, Response
+    from batch import BatchCall, run_batch
+    server = Flask(__name__)
+    server.add_url_rule('/api/empty', 'empty',
+                        lambda: Response(b'', status=204, mimetype='application/json'))
+    
+    results = run_batch(server, [BatchCall(id=0, path='/empty')])
+    assert orjson.loads(orjson.dumps(results)) == [{'id': 0, 'status': 204, 'body': ''}]
+
+@pytest.mark.parametrize('path', ['/../index.html', '/./batch', 'corpuses'])
+def test_batch_rejects_paths_outside_api(session_client, path):
+    plan = [{'id': 0, 'method': 'GET', 'path': path}]
+    status, data = decoded(SESSION.post(URLS.batch, json=plan, timeout=TIMEOUT))
+    assert status == 400
+    assert not data['success']
+
 if __name__ == '__main__':
     try:
-        test_api()
+        main()
     except requests.ConnectionError:
         print("❌ Error: Could not connect to server.")
         print("   Make sure Flask is running on http://localhost:5000")
@@ -0,0 +1,49 @@
+"""
+Tests for the Markov Chain engine's on-disk model cache
+"""
+
+import os
+import pickle
+
+import pytest
+
+from corpuses import CORPUSES
+from markov_engine import _CACHE_VERSION, MarkovChain
+
+TEXT = CORPUSES['shakespeare']['text']
+
+
+def test_cache_hit_skips_build(tmp_path, monkeypatch):
+    statistics = MarkovChain(cache_dir=str(tmp_path)).train(TEXT, 2, cache=True)
+    assert len(os.listdir(tmp_path)) == 1
+
+    chain = MarkovChain(cache_dir=str(tmp_path))
+    monkeypatch.setattr(chain, '_build_model', lambda *args: pytest.fail('model was rebuilt'))
+    assert chain.train(TEXT, 2, cache=True) == statistics
+    assert chain.generate(20)
+
+
+@pytest.mark.parametrize('contents', [b'not a pickle', pickle.dumps(42), pickle.dumps({'vocab': {}})],
+                         ids=['garbage', 'not-a-dict', 'missing-fields'])
+def test_unreadable_cache_file_is_a_miss(tmp_path, contents):
+    chain = MarkovChain(cache_dir=str(tmp_path))
+    path = chain._cache_path(TEXT, 2)
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+    statistics = chain.train(TEXT, 2, cache=True)
+    assert statistics['word_count'] > 0
+
+    # The bad file is replaced by a loadable model
+    with open(path, 'rb') as f:
+        assert pickle.load(f)['statistics'] == statistics
+
+
+def test_uncached_training_writes_nothing(tmp_path):
+    MarkovChain(cache_dir=str(tmp_path / 'models')).train(TEXT, 2)
+    assert not (tmp_path / 'models').exists()
+
+
+def test_cache_key_includes_format_version(tmp_path):
+    path = MarkovChain(cache_dir=str(tmp_path))._cache_path(TEXT, 2)
+    assert path.endswith(f'_2_v{_CACHE_VERSION}.pkl')